@@ -1,184 +1,385 @@
 import sqlite3
+import atexit
 import duckdb
+import functools
 import hashlib
+import itertools
+import queue
+import random
+import re
 import socket
 import threading
-from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple, Union
+import time
+from typing import Dict, List, Optional, Tuple, Union
 import pandas as pd
 
+# sql_info columns filled from log rows; id comes from the sql_info_id_seq sequence
+SQL_INFO_COLUMNS = (
+    "sql_stmt_hash", "sql_stmt", "query_type", "param_values",
+    "timestamp", "caller_name", "caller_ip", "source", "row_count"
+)
+_INSERT_BATCH_SQL = f"INSERT INTO sql_info ({', '.join(SQL_INFO_COLUMNS)}) SELECT * FROM sql_info_batch"
+
+# Queue sentinel telling the writer thread to stop
+_STOP = object()
+
+@functools.lru_cache(maxsize=4096)
+def _sql_fingerprint(sql: str) -> str:
+    """Compute a 128-bit BLAKE2b fingerprint of the SQL statement.
+
+    Used to group identical statements, not as a cryptographic digest.
+    Memoized since the same statements tend to repeat.
+    """
+    return hashlib.blake2b(sql.encode(), digest_size=16).hexdigest()
+
+# query_type values besides OTHER, matching the dashboard's filter choices
+QUERY_TYPES = ("SELECT", "INSERT", "UPDATE", "DELETE", "CREATE")
+
+# Leading keyword of a statement, skipping whitespace, comments and opening parentheses
+_LEADING_KEYWORD = re.compile(r"(?:\s|\(|--[^\n]*(?:\n|$)|/\*.*?\*/)*([A-Za-z]+)", re.S)
+
+@functools.lru_cache(maxsize=4096)
+def _query_type(sql: str) -> str:
+    """Classify a SQL statement as one of QUERY_TYPES or OTHER by its leading keyword"""
+    match = _LEADING_KEYWORD.match(sql)
+    if not match:
+        return "OTHER"
+    keyword = match.group(1).upper()
+    # Common table expressions are treated as reads
+    if keyword == "WITH":
+        return "SELECT"
+    return keyword if keyword in QUERY_TYPES else "OTHER"
+
+class _CountingIterator:
+    """Iterator over executemany parameter sets that counts them as consumed"""
+    __slots__ = ('_it', 'count')
+
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self._it)
+        self.count += 1
+        return item
+
 class SQLiteWrapper:
-    def __init__(self, duckdb_path: str = ":memory:"):
+    def __init__(self, duckdb_path: str = ":memory:", buffer_size: int = 1024,
+                 queue_size: int = 10_000, block_on_full: bool = False,
+                 log_select: bool = False, sample_rate: float = 1.0):
         """Initialize the SQL interceptor with DuckDB storage"""
+        # Read-only SELECTs are skipped unless enabled; other statements are sampled
+        self.log_select = log_select
+        self.sample_rate = sample_rate
         self.duckdb_conn = duckdb.connect(duckdb_path)
         self._setup_storage()
         self.local_data = threading.local()
+        # Caller info does not change for the life of the process
+        self._caller_name, self._caller_ip = self._get_caller_info()
+        # Log rows are queued and written to DuckDB in batches by a background thread
+        self.buffer_size = buffer_size
+        self.block_on_full = block_on_full
+        self.dropped_rows = 0  # Rows lost to queue overflow or failed batch writes
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._duckdb_lock = threading.Lock()
+        # Guards _closed against enqueues, so no row lands behind the stop sentinel
+        self._enqueue_lock = threading.Lock()
+        self._dropped_lock = threading.Lock()
+        self._closed = False
+        self._writer = threading.Thread(target=self._writer_loop, name="sql_info-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
 
     def _setup_storage(self):
         """Create the sql_info table in DuckDB"""
+        # A sequence keeps ids unique across wrappers sharing the same DuckDB file
+        self.duckdb_conn.execute("CREATE SEQUENCE IF NOT EXISTS sql_info_id_seq")
         self.duckdb_conn.execute("""
             CREATE TABLE IF NOT EXISTS sql_info (
-                id INTEGER PRIMARY KEY,
-                raw_sql_stmt TEXT,
-                sql_stmt_hash VARCHAR(64),
+                id INTEGER PRIMARY KEY DEFAULT nextval('sql_info_id_seq'),
+                sql_stmt_hash VARCHAR(32),  -- Statement fingerprint, not a cryptographic digest
                 sql_stmt TEXT,
-                param_values ARRAY(VARCHAR),
-                timestamp TIMESTAMP,
+                query_type VARCHAR(32),  -- One of QUERY_TYPES or OTHER, computed at ingest
+                param_values VARCHAR[],
+                timestamp BIGINT,  -- Nanoseconds since the Unix epoch
                 caller_name VARCHAR(255),
                 caller_ip VARCHAR(45),
-                source VARCHAR(50)  -- Added to track if query came from cursor or pandas
+                source VARCHAR(50),  -- Added to track if query came from cursor or pandas
+                row_count INTEGER  -- Number of parameter sets for bulk executes
             )
         """)
+        # No index on timestamp: rows are appended in time order, so DuckDB's
+        # min/max zonemaps already prune time-range scans
+        # Backward compatible view exposing the former raw_sql_stmt column
+        # and timestamp as a TIMESTAMP (UTC)
+        self.duckdb_conn.execute("""
+            CREATE OR REPLACE VIEW sql_info_v AS
+            SELECT sql_stmt AS raw_sql_stmt,
+                   * REPLACE (make_timestamp(timestamp // 1000) AS timestamp)
+            FROM sql_info
+        """)
 
     def _get_caller_info(self) -> tuple[str, str]:
         """Get caller name and IP address"""
-        caller_name = socket.gethostname()
+        try:
+            caller_name = socket.gethostname()
+        except:
+            caller_name = "localhost"
         try:
             caller_ip = socket.gethostbyname(caller_name)
         except:
             caller_ip = "127.0.0.1"
         return caller_name, caller_ip
 
-    def _compute_hash(self, sql: str) -> str:
-        """Compute hash of normalized SQL statement"""
-        return hashlib.sha256(sql.encode()).hexdigest()
-
-    def _format_param_value(self, value: Any) -> str:
-        """Convert parameter value to string representation"""
-        if value is None:
-            return 'NULL'
-        elif isinstance(value, (int, float)):
-            return str(value)
-        elif isinstance(value, (datetime, str)):
-            return f"'{str(value)}'"
-        elif isinstance(value, (list, tuple)):
-            return f"ARRAY{str(value)}"
-        return str(value)
-
     def connect(self, database: str, **kwargs) -> 'WrappedConnection':
         """Create a wrapped SQLite connection"""
-        sqlite_conn = sqlite3.connect(database, **kwargs)
-        return WrappedConnection(sqlite_conn, self)
+        return sqlite3.connect(
+            database, factory=functools.partial(WrappedConnection, wrapper=self), **kwargs
+        )
 
-    def log_query(self, sql: str, parameters: Optional[Union[tuple, dict]] = None, source: str = "cursor"):
-        """Log SQL query to DuckDB"""
-        caller_name, caller_ip = self._get_caller_info()
-        sql_hash = self._compute_hash(sql)
+    def log_query(self, sql: str, parameters: Optional[Union[tuple, dict]] = None,
+                  source: str = "cursor", row_count: int = 1):
+        """Queue SQL query for logging to DuckDB"""
+        if self._closed:
+            return
+        query_type = _query_type(sql)
+        if query_type == "SELECT" and not self.log_select:
+            return
+        if self.sample_rate < 1.0 and random.random() > self.sample_rate:
+            return
+        sql_hash = _sql_fingerprint(sql)
 
-        # Convert parameters to string values
+        # Convert parameters to plain string values; display formatting is left to readers
         param_values = []
         if parameters:
-            if isinstance(parameters, dict):
-                param_values = [self._format_param_value(v) for v in parameters.values()]
-            else:
-                param_values = [self._format_param_value(v) for v in parameters]
+            values = parameters.values() if isinstance(parameters, dict) else parameters
+            param_values = [
+                None if v is None else (repr(v) if isinstance(v, (int, float, bool)) else str(v))
+                for v in values
+            ]
 
-        self.duckdb_conn.execute("""
-            INSERT INTO sql_info (
-                raw_sql_stmt, sql_stmt_hash, sql_stmt, param_values,
-                timestamp, caller_name, caller_ip, source
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            sql,
+        row = (
             sql_hash,
             sql,
+            query_type,
             param_values,
-            datetime.now(),
-            caller_name,
-            caller_ip,
-            source
-        ))
-
-    def query_history(self, conditions: str = "") -> List[Dict]:
-        """Query the stored SQL information"""
-        query = "SELECT * FROM sql_info"
+            time.time_ns(),
+            self._caller_name,
+            self._caller_ip,
+            source,
+            row_count
+        )
+        with self._enqueue_lock:
+            if self._closed:
+                return
+            if self.block_on_full:
+                self._queue.put(row)
+            else:
+                try:
+                    self._queue.put_nowait(row)
+                except queue.Full:
+                    self._count_dropped(1)
+
+    def _count_dropped(self, n: int):
+        """Record log rows that will never reach DuckDB"""
+        with self._dropped_lock:
+            self.dropped_rows += n
+
+    def _writer_loop(self):
+        """Drain the log queue in batches until the stop sentinel arrives"""
+        while True:
+            rows = []
+            markers = []
+            stop = False
+            item = self._queue.get()
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                if isinstance(item, threading.Event):
+                    # Flush marker: every row queued before it is in this batch
+                    markers.append(item)
+                    break
+                rows.append(item)
+                if len(rows) >= self.buffer_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                if rows:
+                    self._write_batch(rows)
+            except Exception as e:
+                self._count_dropped(len(rows))
+                print(f"Error writing sql_info batch, dropped {len(rows)} rows: {e}")
+            for marker in markers:
+                marker.set()
+            if stop:
+                return
+
+    def _write_batch(self, rows: List[Tuple]):
+        """Bulk load log rows into DuckDB, bypassing per-row INSERTs"""
+        with self._duckdb_lock:
+            batch = pd.DataFrame.from_records(rows, columns=SQL_INFO_COLUMNS)
+            # One INSERT ... SELECT per batch: the statement is parsed and planned
+            # once per batch rather than per row
+            self.duckdb_conn.register("sql_info_batch", batch)
+            try:
+                # No BEGIN/COMMIT around the batch: a single INSERT statement is
+                # already atomic, so an explicit transaction only adds statements
+                self.duckdb_conn.execute(_INSERT_BATCH_SQL)
+            finally:
+                self.duckdb_conn.unregister("sql_info_batch")
+
+    def flush(self):
+        """Block until rows queued before this call are written to DuckDB"""
+        if self._closed:
+            # close() writes everything queued before stopping the writer
+            self._writer.join()
+            return
+        marker = threading.Event()
+        self._queue.put(marker)
+        while not marker.wait(0.1):
+            if not self._writer.is_alive():
+                return
+
+    def close(self):
+        """Write any queued log rows and stop the writer thread"""
+        with self._enqueue_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        atexit.unregister(self.close)
+        self._writer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def query_history(self, conditions: str = "") -> pd.DataFrame:
+        """Query the stored SQL information as a DataFrame"""
+        self.flush()
+        query = """
+            SELECT * FROM (
+                SELECT * REPLACE (make_timestamp(timestamp // 1000) AS timestamp)
+                FROM sql_info
+            )
+        """
         if conditions:
             query += f" WHERE {conditions}"
         query += " ORDER BY timestamp DESC"
         
-        results = self.duckdb_conn.execute(query).fetchall()
-        columns = [desc[0] for desc in self.duckdb_conn.description]
-        
-        return [dict(zip(columns, row)) for row in results]
+        with self._duckdb_lock:
+            return self.duckdb_conn.execute(query).fetch_df()
+
+    def query_history_records(self, conditions: str = "") -> List[Dict]:
+        """Query the stored SQL information as a list of dicts"""
+        return self.query_history(conditions).to_dict(orient="records")
 
-class WrappedConnection:
-    def __init__(self, connection: sqlite3.Connection, wrapper: SQLiteWrapper):
-        self._connection = connection
+class WrappedConnection(sqlite3.Connection):
+    """sqlite3 connection created through the connect() factory hook.
+
+    execute/executemany log the statement as written plus its parameters.
+    The trace callback only logs what sqlite3 runs on its own, such as the
+    implicit BEGIN and the COMMIT issued by commit().
+    """
+    __slots__ = ('_wrapper', '_in_call', '_user_trace')
+
+    def __init__(self, *args, wrapper: SQLiteWrapper, **kwargs):
+        super().__init__(*args, **kwargs)
         self._wrapper = wrapper
-        # Store original methods we need to wrap
-        self._orig_execute = connection.execute
-        self._orig_executemany = connection.executemany
-        # Replace connection methods with our wrapped versions
-        connection.execute = self.execute
-        connection.executemany = self.executemany
-
-    def cursor(self) -> 'WrappedCursor':
+        self._in_call = False
+        self._user_trace = None
+        # sqlite3 calls this from C with the expanded SQL of every statement it runs
+        super().set_trace_callback(self._trace)
+
+    def set_trace_callback(self, trace_callback):
+        """Install a user trace callback, called before the logging one"""
+        self._user_trace = trace_callback
+
+    def _trace(self, sql: str):
+        """Log a statement reported by the sqlite3 trace callback"""
+        if self._user_trace is not None:
+            self._user_trace(sql)
+        if self._in_call and not sql.startswith("BEGIN"):
+            # Already logged unexpanded by execute/executemany
+            return
+        self._wrapper.log_query(sql, source="trace")
+
+    def cursor(self, factory=None) -> 'WrappedCursor':
         """Create a wrapped cursor"""
-        return WrappedCursor(self._connection.cursor(), self._wrapper)
+        return super().cursor(factory or WrappedCursor)
 
-    def execute(self, sql: str, parameters: Optional[Union[tuple, dict]] = None) -> sqlite3.Cursor:
-        """Execute a SQL query and log it (used by pandas)"""
-        try:
-            self._wrapper.log_query(sql, parameters, source="pandas")
-            # Use stored original method to avoid recursion
-            return self._orig_execute(sql, parameters if parameters is not None else ())
-        except Exception as e:
-            # Log the error but don't interfere with normal error handling
-            print(f"Error in wrapped execute: {e}")
-            raise
-
-    def executemany(self, sql: str, parameters: List[Union[tuple, dict]]) -> sqlite3.Cursor:
-        """Execute many SQL queries and log them (used by pandas)"""
-        try:
-            # For executemany, we'll log once with the first set of parameters
-            if parameters:
-                self._wrapper.log_query(sql, parameters[0], source="pandas_bulk")
-            # Use stored original method to avoid recursion
-            return self._orig_executemany(sql, parameters)
-        except Exception as e:
-            print(f"Error in wrapped executemany: {e}")
-            raise
+    def execute(self, sql: str, parameters: Union[tuple, dict] = ()) -> 'WrappedCursor':
+        """Execute a SQL query and log it"""
+        return self.cursor().execute(sql, parameters)
 
-    def __enter__(self):
-        return self
+    def executemany(self, sql: str, parameters: List[Union[tuple, dict]]) -> 'WrappedCursor':
+        """Execute a SQL query for each parameter set and log it once"""
+        return self.cursor().executemany(sql, parameters)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self._connection.close()
+        # Commit or roll back like sqlite3.Connection, then flush the log and close
+        super().__exit__(exc_type, exc_val, exc_tb)
+        self._wrapper.flush()
+        self.close()
 
-    def __getattr__(self, name):
-        """Delegate all other attributes to the underlying connection"""
-        return getattr(self._connection, name)
+class WrappedCursor(sqlite3.Cursor):
+    """sqlite3 cursor that can be used as a context manager"""
+    __slots__ = ()
 
-class WrappedCursor:
-    def __init__(self, cursor: sqlite3.Cursor, wrapper: SQLiteWrapper):
-        self._cursor = cursor
-        self._wrapper = wrapper
-
-    def execute(self, sql: str, parameters: Optional[Union[tuple, dict]] = None) -> 'WrappedCursor':
+    def execute(self, sql: str, parameters: Union[tuple, dict] = ()) -> 'WrappedCursor':
         """Execute a SQL query and log it"""
-        self._wrapper.log_query(sql, parameters, source="cursor")
-        if parameters is None:
-            self._cursor.execute(sql)
-        else:
-            self._cursor.execute(sql, parameters)
-        return self
+        conn = self.connection
+        conn._wrapper.log_query(sql, parameters, source="cursor")
+        in_call, conn._in_call = conn._in_call, True
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            conn._in_call = in_call
 
     def executemany(self, sql: str, parameters: List[Union[tuple, dict]]) -> 'WrappedCursor':
-        """Execute many SQL queries and log them"""
-        for params in parameters:
-            self._wrapper.log_query(sql, params, source="cursor")
-        self._cursor.executemany(sql, parameters)
-        return self
+        """Execute a SQL query for each parameter set and log it once"""
+        conn = self.connection
+        if isinstance(parameters, (list, tuple)):
+            first = parameters[0] if parameters else None
+            rows = None
+        else:
+            # Count parameter sets as sqlite3 streams them instead of materializing them
+            it = iter(parameters)
+            first = next(it, None)
+            rows = parameters = _CountingIterator(it if first is None else itertools.chain((first,), it))
+        # A Python trace call per parameter set is costly, so the callback stays
+        # installed only when the user has one; otherwise an implicit BEGIN is
+        # detected from in_transaction
+        traced = conn._user_trace is not None
+        in_transaction = conn.in_transaction
+        in_call, conn._in_call = conn._in_call, True
+        if not traced:
+            sqlite3.Connection.set_trace_callback(conn, None)
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            conn._in_call = in_call
+            if not traced:
+                sqlite3.Connection.set_trace_callback(conn, conn._trace)
+                if conn.in_transaction and not in_transaction:
+                    conn._wrapper.log_query("BEGIN ", source="trace")
+            conn._wrapper.log_query(sql, first, source="cursor_bulk",
+                                    row_count=len(parameters) if rows is None else rows.count)
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self._cursor.close()
-
-    def __getattr__(self, name):
-        """Delegate all other attributes to the underlying cursor"""
-        return getattr(self._cursor, name)
+        self.close()
 
 # Usage Example
 if __name__ == "__main__":
@@ -203,7 +404,7 @@ if __name__ == "__main__":
         
         # Check the logged queries
         print("\nLogged queries:")
-        for query in wrapper.query_history():
+        for query in wrapper.query_history_records():
             print(f"SQL: {query['sql_stmt']}")
             print(f"Source: {query['source']}")
             print(f"Time: {query['timestamp']}")
@@ -239,11 +440,11 @@ if __name__ == "__main__":
         new_users.to_sql("users", conn, if_exists="append", index=False)
         
         # Check query history
-        recent_queries = wrapper.query_history()
+        recent_queries = wrapper.query_history_records()
         print("\nRecent queries:")
         for query in recent_queries:
             print(f"SQL: {query['sql_stmt']}")
             print(f"Parameters: {query['param_values']}")
-            print(f"Source: {query['source']}")  # Will show if query came from cursor or pandas
+            print(f"Source: {query['source']}")
             print(f"Timestamp: {query['timestamp']}")
             print("-" * 80)
\ No newline at end of file
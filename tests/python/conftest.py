@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make the `sqlite` package under src/python importable without installing it
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src", "python"))
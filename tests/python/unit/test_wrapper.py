@@ -0,0 +1,244 @@
+import gc
+import threading
+import time
+import weakref
+
+import pandas as pd
+import pytest
+
+from sqlite.wrapper import SQLiteWrapper, WrappedConnection, WrappedCursor, _query_type
+
+
+@pytest.fixture
+def wrapper():
+    w = SQLiteWrapper()
+    yield w
+    w.close()
+
+
+def count_rows(wrapper: SQLiteWrapper) -> int:
+    with wrapper._duckdb_lock:
+        return wrapper.duckdb_conn.execute("SELECT count(*) FROM sql_info").fetchone()[0]
+
+
+def test_flush_writes_rows_queued_before_it(wrapper):
+    for i in range(2500):
+        wrapper.log_query("INSERT INTO t VALUES (?)", (i,))
+    wrapper.flush()
+    assert count_rows(wrapper) == 2500
+
+
+def test_close_writes_queued_rows_then_stops_writer():
+    w = SQLiteWrapper()
+    for i in range(100):
+        w.log_query("INSERT INTO t VALUES (?)", (i,))
+    w.close()
+    assert not w._writer.is_alive()
+    assert count_rows(w) == 100
+
+    # Logging and flushing after close are no-ops
+    w.log_query("INSERT INTO t VALUES (?)", (0,))
+    w.flush()
+    assert count_rows(w) == 100
+
+
+def test_close_releases_wrapper():
+    w = SQLiteWrapper()
+    ref = weakref.ref(w)
+    w.close()
+    del w
+    gc.collect()
+    assert ref() is None
+
+
+def test_full_queue_drops_and_counts_rows():
+    w = SQLiteWrapper(buffer_size=1, queue_size=10)
+    try:
+        with w._duckdb_lock:
+            # Let the writer take one row and block on the lock
+            w.log_query("INSERT INTO t VALUES (1)")
+            deadline = time.monotonic() + 5
+            while not w._queue.empty() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            for _ in range(15):
+                w.log_query("INSERT INTO t VALUES (1)")
+        assert w.dropped_rows == 5
+        w.flush()
+        assert count_rows(w) == 11
+    finally:
+        w.close()
+
+
+def test_select_skipped_unless_enabled():
+    w = SQLiteWrapper()
+    w.log_query("SELECT 1")
+    w.flush()
+    assert count_rows(w) == 0
+    w.close()
+
+    w = SQLiteWrapper(log_select=True)
+    w.log_query("SELECT 1")
+    w.flush()
+    assert count_rows(w) == 1
+    w.close()
+
+
+def test_query_history_dtypes(wrapper):
+    wrapper.log_query("INSERT INTO t VALUES (?, ?)", (1, None))
+    history = wrapper.query_history()
+    assert isinstance(history, pd.DataFrame)
+    assert pd.api.types.is_datetime64_any_dtype(history["timestamp"])
+    assert pd.api.types.is_integer_dtype(history["id"])
+    assert pd.api.types.is_integer_dtype(history["row_count"])
+    row = wrapper.query_history_records()[0]
+    assert row["query_type"] == "INSERT"
+    assert list(row["param_values"]) == ["1", None]
+    assert len(row["sql_stmt_hash"]) == 32
+
+
+def test_connect_returns_wrapped_connection_and_traces(wrapper):
+    with wrapper.connect(":memory:") as conn:
+        assert isinstance(conn, WrappedConnection)
+        conn.execute("CREATE TABLE t (a INTEGER)")
+        with conn.cursor() as cursor:
+            assert isinstance(cursor, WrappedCursor)
+            cursor.execute("INSERT INTO t VALUES (?)", (7,))
+        conn.commit()
+    history = wrapper.query_history()
+    sources = dict(zip(history["sql_stmt"], history["source"]))
+    assert sources["CREATE TABLE t (a INTEGER)"] == "cursor"
+    assert sources["INSERT INTO t VALUES (?)"] == "cursor"
+    # Statements sqlite3 runs on its own still come from the trace callback
+    assert sources["BEGIN "] == "trace"
+    assert sources["COMMIT"] == "trace"
+    assert "INSERT INTO t VALUES (7)" not in sources
+
+
+def test_execute_logs_template_and_parameters(wrapper):
+    with wrapper.connect(":memory:") as conn:
+        conn.execute("CREATE TABLE t (a INTEGER, b BLOB)")
+        for i in range(5):
+            conn.execute("INSERT INTO t VALUES (?, ?)", (i, b"x" * 1000))
+    inserts = wrapper.query_history("query_type = 'INSERT'")
+    assert len(inserts) == 5
+    assert set(inserts["sql_stmt"]) == {"INSERT INTO t VALUES (?, ?)"}
+    assert inserts["sql_stmt_hash"].nunique() == 1
+    assert sorted(v[0] for v in inserts["param_values"]) == ["0", "1", "2", "3", "4"]
+
+
+@pytest.mark.parametrize("via_cursor", [False, True])
+def test_executemany_logs_once_with_row_count(wrapper, via_cursor):
+    with wrapper.connect(":memory:") as conn:
+        conn.execute("CREATE TABLE t (a INTEGER, b TEXT)")
+        rows = ((i, f"v{i}") for i in range(500))
+        target = conn.cursor() if via_cursor else conn
+        target.executemany("INSERT INTO t VALUES (?, ?)", rows)
+        assert conn.execute("SELECT count(*) FROM t").fetchone()[0] == 500
+        # Logging carries on normally after the batch
+        conn.execute("DELETE FROM t")
+    history = wrapper.query_history()
+    bulk = history[history["source"] == "cursor_bulk"]
+    assert len(bulk) == 1
+    assert bulk["sql_stmt"].iloc[0] == "INSERT INTO t VALUES (?, ?)"
+    assert bulk["row_count"].iloc[0] == 500
+    assert list(bulk["param_values"].iloc[0]) == ["0", "v0"]
+    assert "DELETE FROM t" in set(history["sql_stmt"])
+    assert not history["sql_stmt"].str.startswith("INSERT INTO t VALUES (1").any()
+
+
+def test_connection_exit_commits_like_sqlite3(wrapper, tmp_path):
+    db = str(tmp_path / "x.db")
+    with wrapper.connect(db) as conn:
+        conn.execute("CREATE TABLE t (a INTEGER)")
+        conn.execute("INSERT INTO t VALUES (1)")
+    with pytest.raises(ZeroDivisionError):
+        with wrapper.connect(db) as conn:
+            conn.execute("INSERT INTO t VALUES (2)")
+            1 / 0
+    with wrapper.connect(db) as conn:
+        assert conn.execute("SELECT a FROM t").fetchall() == [(1,)]
+
+
+def test_failed_batch_counts_dropped_rows(wrapper):
+    wrapper.log_query("INSERT INTO t VALUES (1)")
+    wrapper.flush()
+    with wrapper._duckdb_lock:
+        wrapper.duckdb_conn.execute("DROP VIEW sql_info_v")
+        wrapper.duckdb_conn.execute("ALTER TABLE sql_info RENAME TO sql_info_old")
+    for _ in range(3):
+        wrapper.log_query("INSERT INTO t VALUES (1)")
+    wrapper.flush()
+    assert wrapper.dropped_rows == 3
+
+
+def test_close_leaves_no_rows_behind_stop_sentinel():
+    w = SQLiteWrapper(queue_size=100)
+    stop = threading.Event()
+
+    def producer():
+        while not stop.is_set():
+            w.log_query("INSERT INTO t VALUES (1)")
+
+    threads = [threading.Thread(target=producer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    w.close()
+    stop.set()
+    for t in threads:
+        t.join()
+    # Every row accepted before close was written, none queued after it
+    assert w._queue.empty()
+
+
+def test_executemany_keeps_user_trace_and_implicit_begin(wrapper):
+    seen = []
+    with wrapper.connect(":memory:") as conn:
+        conn.execute("CREATE TABLE t (a INTEGER)")
+        conn.set_trace_callback(seen.append)
+        conn.executemany("INSERT INTO t VALUES (?)", ((i,) for i in range(3)))
+        conn.execute("DELETE FROM t")
+    # The user callback sees every statement, including per-row ones
+    assert seen.count("INSERT INTO t VALUES (1)") == 1
+    assert "DELETE FROM t" in seen
+    history = wrapper.query_history()
+    assert "BEGIN " in set(history["sql_stmt"])
+    bulk = history[history["source"] == "cursor_bulk"]
+    assert bulk["row_count"].tolist() == [3]
+
+
+def test_executemany_logs_implicit_begin_without_user_trace(wrapper):
+    with wrapper.connect(":memory:") as conn:
+        conn.execute("CREATE TABLE t (a INTEGER)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(1,), (2,)])
+        conn.executemany("INSERT INTO t VALUES (?)", [(3,)])
+    history = wrapper.query_history()
+    # Only the first batch opens a transaction
+    assert (history["sql_stmt"] == "BEGIN ").sum() == 1
+    assert sorted(history.loc[history["source"] == "cursor_bulk", "row_count"]) == [1, 2]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT 1",
+    "  select 1",
+    "-- comment\nSELECT 1",
+    "/* multi\nline */ SELECT 1",
+    "WITH q AS (SELECT 1) SELECT * FROM q",
+    "(SELECT 1) UNION (SELECT 2)",
+])
+def test_reads_skipped_by_default(wrapper, sql):
+    wrapper.log_query(sql)
+    wrapper.flush()
+    assert count_rows(wrapper) == 0
+
+
+@pytest.mark.parametrize("sql, query_type", [
+    ("-- only a comment", "OTHER"),
+    ("-- note\nINSERT INTO t VALUES (1)", "INSERT"),
+    ("/* unterminated SELECT", "OTHER"),
+    ("PRAGMA table_info(t)", "OTHER"),
+    ("BEGIN ", "OTHER"),
+    ("SELECT*FROM t", "SELECT"),
+])
+def test_query_type_skips_comments(sql, query_type):
+    assert _query_type(sql) == query_type
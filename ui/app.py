@@ -3,8 +3,9 @@ import streamlit as st
 import duckdb
 import pandas as pd
 import plotly.express as px
+import time
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Tuple
+from typing import Any, Optional, Dict, List, Tuple
 
 # Configuration
 CONFIG = {
@@ -50,63 +51,154 @@ def create_sidebar_filters() -> Tuple[str, str]:
     
     return selected_range, selected_type
 
-def build_query(selected_range: str, selected_type: str) -> str:
-    """Build the SQL query based on selected filters."""
-    base_query = """
-        SELECT 
-            query,
-            timestamp,
-            hostname,
-            status,
-            CASE 
-                WHEN query ILIKE 'SELECT%' THEN 'SELECT'
-                WHEN query ILIKE 'INSERT%' THEN 'INSERT'
-                WHEN query ILIKE 'UPDATE%' THEN 'UPDATE'
-                WHEN query ILIKE 'DELETE%' THEN 'DELETE'
-                WHEN query ILIKE 'CREATE%' THEN 'CREATE'
-                ELSE 'OTHER'
-            END as query_type
-        FROM sqlite_queries
-        WHERE 1=1
-    """
+def build_filters(selected_range: str, selected_type: str) -> Tuple[str, List[Any]]:
+    """Build the WHERE clause and its bind parameters for the selected filters."""
+    filters = "WHERE 1=1"
+    params = []
     
-    if CONFIG["time_ranges"][selected_range]:
-        base_query += f" AND timestamp >= CURRENT_TIMESTAMP - INTERVAL '{CONFIG['time_ranges'][selected_range]}'"
+    time_range = CONFIG["time_ranges"][selected_range]
+    if time_range:
+        # sql_info stores timestamps as nanoseconds since the epoch
+        filters += " AND timestamp >= ?"
+        params.append(time.time_ns() - int(time_range.total_seconds() * 1_000_000_000))
     
+    # query_type is normalized at ingest to the CONFIG["query_types"] values
     if selected_type != "ALL":
-        base_query += f" AND query ILIKE '{selected_type}%'"
+        filters += " AND query_type = ?"
+        params.append(selected_type)
     
-    return base_query
+    return filters, params
 
-def display_metrics(df: pd.DataFrame):
+def run_query(sql: str, params: List[Any]) -> pd.DataFrame:
+    """Run a dashboard query against DuckDB."""
+    return init_connection().execute(sql, params).fetch_df()
+
+@st.cache_data(ttl=30)
+def load_summary(selected_range: str, selected_type: str) -> pd.DataFrame:
+    """Load headline counts, cached per filter selection."""
+    filters, params = build_filters(selected_range, selected_type)
+    return run_query(f"""
+        SELECT
+            count(*) AS total,
+            make_timestamp(min(timestamp) // 1000) AS first_timestamp,
+            make_timestamp(max(timestamp) // 1000) AS last_timestamp,
+            count(DISTINCT caller_name) AS hosts
+        FROM sql_info
+        {filters}
+    """, params)
+
+@st.cache_data(ttl=30)
+def load_counts_by_type(selected_range: str, selected_type: str) -> pd.DataFrame:
+    """Load query counts per query type, cached per filter selection."""
+    filters, params = build_filters(selected_range, selected_type)
+    return run_query(f"""
+        SELECT query_type, count(*) AS count
+        FROM sql_info
+        {filters}
+        GROUP BY 1
+    """, params)
+
+@st.cache_data(ttl=30)
+def load_recent_queries(selected_range: str, selected_type: str) -> pd.DataFrame:
+    """Load the 100 most recent queries, cached per filter selection."""
+    filters, params = build_filters(selected_range, selected_type)
+    return run_query(f"""
+        SELECT
+            make_timestamp(timestamp // 1000) AS timestamp,
+            query_type,
+            sql_stmt AS query,
+            source,
+            caller_name AS hostname
+        FROM sql_info
+        {filters}
+        ORDER BY sql_info.timestamp DESC
+        LIMIT 100
+    """, params)
+
+@st.cache_data(ttl=30)
+def load_top_queries(selected_range: str, selected_type: str) -> pd.DataFrame:
+    """Load the 10 most common queries, cached per filter selection."""
+    filters, params = build_filters(selected_range, selected_type)
+    return run_query(f"""
+        SELECT sql_stmt AS query, count(*) AS count
+        FROM sql_info
+        {filters}
+        GROUP BY 1
+        ORDER BY count DESC
+        LIMIT 10
+    """, params)
+
+@st.cache_data(ttl=30)
+def load_queries_by_host(selected_range: str, selected_type: str) -> pd.DataFrame:
+    """Load query counts per host, cached per filter selection."""
+    filters, params = build_filters(selected_range, selected_type)
+    return run_query(f"""
+        SELECT caller_name AS hostname, count(*) AS count
+        FROM sql_info
+        {filters}
+        GROUP BY 1
+        ORDER BY count DESC
+    """, params)
+
+@st.cache_data(ttl=30)
+def load_timeline(selected_range: str, selected_type: str) -> pd.DataFrame:
+    """Load per-minute query counts, cached per filter selection."""
+    filters, params = build_filters(selected_range, selected_type)
+    return run_query(f"""
+        SELECT
+            time_bucket(INTERVAL '1 minute', make_timestamp(timestamp // 1000)) AS timestamp,
+            count(*) AS count
+        FROM sql_info
+        {filters}
+        GROUP BY 1
+        ORDER BY 1
+    """, params)
+
+@st.cache_data(ttl=30)
+def load_hourly_patterns(selected_range: str, selected_type: str) -> pd.DataFrame:
+    """Load hourly query counts per query type, cached per filter selection."""
+    filters, params = build_filters(selected_range, selected_type)
+    hourly_df = run_query(f"""
+        SELECT
+            time_bucket(INTERVAL '1 hour', make_timestamp(timestamp // 1000)) AS timestamp,
+            query_type,
+            count(*) AS count
+        FROM sql_info
+        {filters}
+        GROUP BY 1, 2
+        ORDER BY 1
+    """, params)
+    return hourly_df.pivot(index='timestamp', columns='query_type', values='count').fillna(0)
+
+def display_metrics(summary: pd.DataFrame):
     """Display key metrics at the top of the dashboard."""
     col1, col2, col3 = st.columns(3)
+    total = int(summary['total'].iloc[0])
     
     with col1:
-        st.metric("Total Queries", len(df))
+        st.metric("Total Queries", total)
     
     with col2:
-        if not df.empty:
-            avg_queries_per_hour = len(df) / max(1, (df['timestamp'].max() - df['timestamp'].min()).total_seconds() / 3600)
+        if total:
+            span = summary['last_timestamp'].iloc[0] - summary['first_timestamp'].iloc[0]
+            avg_queries_per_hour = total / max(1, span.total_seconds() / 3600)
             st.metric("Avg Queries/Hour", f"{avg_queries_per_hour:.1f}")
     
     with col3:
-        if not df.empty:
-            st.metric("Unique Hosts", df['hostname'].nunique())
+        if total:
+            st.metric("Unique Hosts", int(summary['hosts'].iloc[0]))
 
-def plot_query_distribution(df: pd.DataFrame):
+def plot_query_distribution(counts_df: pd.DataFrame):
     """Create and display query distribution pie chart."""
-    if not df.empty:
+    if not counts_df.empty:
         st.subheader("Query Distribution")
-        fig = px.pie(df, names='query_type', title="Query Types Distribution")
+        fig = px.pie(counts_df, names='query_type', values='count', title="Query Types Distribution")
         st.plotly_chart(fig)
 
-def plot_query_timeline(df: pd.DataFrame):
+def plot_query_timeline(timeline_df: pd.DataFrame):
     """Create and display query timeline."""
-    if not df.empty:
+    if not timeline_df.empty:
         st.subheader("Query Timeline")
-        timeline_df = df.set_index('timestamp').resample('1min').size().reset_index()
-        timeline_df.columns = ['timestamp', 'count']
         fig = px.line(timeline_df, x='timestamp', y='count', title="Queries per Minute")
         st.plotly_chart(fig)
 
@@ -114,59 +206,49 @@ def display_recent_queries(df: pd.DataFrame):
     """Display recent queries table."""
     st.subheader("Recent Queries")
     if not df.empty:
-        st.dataframe(
-            df[['timestamp', 'query_type', 'query', 'status', 'hostname']]
-            .sort_values('timestamp', ascending=False)
-            .head(100)
-        )
+        st.dataframe(df)
     else:
         st.info("No queries found for the selected filters")
 
-def display_query_analysis(df: pd.DataFrame):
+def display_query_analysis(selected_range: str, selected_type: str):
     """Display detailed query analysis section."""
     if st.checkbox("Show Query Analysis"):
         st.subheader("Query Analysis")
         
         # Most common queries
         st.write("Most Common Queries")
-        common_queries = df['query'].value_counts().head(10)
-        st.bar_chart(common_queries)
+        common_queries = load_top_queries(selected_range, selected_type)
+        st.bar_chart(common_queries.set_index('query')['count'])
         
         # Performance by host
         st.write("Queries by Host")
-        host_dist = df['hostname'].value_counts()
-        st.bar_chart(host_dist)
+        host_dist = load_queries_by_host(selected_range, selected_type)
+        st.bar_chart(host_dist.set_index('hostname')['count'])
 
         # Additional analysis features can be added here
         if st.checkbox("Show Advanced Analysis"):
-            display_advanced_analysis(df)
+            display_advanced_analysis(load_hourly_patterns(selected_range, selected_type))
 
-def display_advanced_analysis(df: pd.DataFrame):
+def display_advanced_analysis(hourly_patterns: pd.DataFrame):
     """Display advanced analysis features."""
     # Example advanced analysis - can be expanded
     st.write("Query Patterns Over Time")
-    hourly_patterns = df.set_index('timestamp').resample('H')['query_type'].value_counts()
     st.line_chart(hourly_patterns)
 
 def main():
     """Main application entry point."""
     # Initialize
-    conn = init_connection()
     setup_page()
     
     # Get filters
     selected_range, selected_type = create_sidebar_filters()
     
-    # Get data
-    query = build_query(selected_range, selected_type)
-    df = conn.execute(query).df()
-    
-    # Display components
-    display_metrics(df)
-    plot_query_distribution(df)
-    plot_query_timeline(df)
-    display_recent_queries(df)
-    display_query_analysis(df)
+    # Display components, each backed by a query selecting only the columns it needs
+    display_metrics(load_summary(selected_range, selected_type))
+    plot_query_distribution(load_counts_by_type(selected_range, selected_type))
+    plot_query_timeline(load_timeline(selected_range, selected_type))
+    display_recent_queries(load_recent_queries(selected_range, selected_type))
+    display_query_analysis(selected_range, selected_type)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file